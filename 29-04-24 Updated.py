@@ -1,207 +1,379 @@
 from __future__ import annotations
-import concurrent.futures
+import heapq
+import itertools
+import logging
+import os
+import queue
+import sys
 import threading
 import time
 import random
-import queue
-from datetime import datetime
-from abc import ABC, abstractmethod
+import statistics
+from array import array
+from collections import deque
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional, List
 import mysql.connector
-from faker import Faker
 
 # Previous code
-class Handler(ABC):
-    @abstractmethod
-    def set_next(self, handler: Handler) -> Handler:
-        pass
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+# With SIMULATION_MODE=1 visits advance a logical clock instead of sleeping, so runs take no real time
+SIMULATION_MODE = os.environ.get("SIMULATION_MODE") == "1"
+
+
+def format_time(timestamp: float) -> str:
+    return time.strftime(TIME_FORMAT, time.localtime(timestamp))
+
+
+# Visit logs go through a queue to a single listener thread, so workers never wait on stdout
+visit_log = logging.getLogger("park.visits")
+visit_log.setLevel(logging.INFO)
+visit_log.propagate = False
+_log_handler: Optional[QueueHandler] = None
+_log_listener: Optional[QueueListener] = None
+
+
+def start_logging():
+    # Handler and listener are set up together, so records never pile up in a queue nobody reads
+    global _log_handler, _log_listener
+    log_queue = queue.SimpleQueue()
+    _log_handler = QueueHandler(log_queue)
+    # Visits go to stdout, worker errors stay on stderr as before
+    visits_out = logging.StreamHandler(sys.stdout)
+    visits_out.addFilter(lambda record: record.levelno < logging.ERROR)
+    errors_out = logging.StreamHandler(sys.stderr)
+    errors_out.setLevel(logging.ERROR)
+    _log_listener = QueueListener(log_queue, visits_out, errors_out, respect_handler_level=True)
+    visit_log.addHandler(_log_handler)
+    _log_listener.start()
+
+
+def stop_logging():
+    # Writes out the remaining records and detaches the handler again
+    global _log_handler, _log_listener
+    if _log_listener is None:  # start_logging() never ran
+        return
+    visit_log.removeHandler(_log_handler)
+    _log_listener.stop()
+    _log_handler = _log_listener = None
 
-    @abstractmethod
-    def handle(self, request) -> Optional[str]:
-        pass
 
-class AbstractHandler(Handler):
-    _next_handler: Optional[Handler] = None
+_thread_state = threading.local()
+# Every generator is spawned from this one, so setting PARK_SEED replays the same park day
+_root_rng = random.Random(os.environ.get("PARK_SEED"))
 
-    def set_next(self, handler: Handler) -> Handler:
-        self._next_handler = handler
-        return handler
 
-    @abstractmethod
-    def handle(self, customer: Customer) -> Optional[str]:
-        if self._next_handler:
-            return self._next_handler.handle(customer)
-        return None
+def spawn_rng() -> random.Random:
+    # A child generator with its own stream, seeded from the root generator
+    return random.Random(_root_rng.getrandbits(64))
+
+
+def thread_rng() -> random.Random:
+    # Every thread draws from its own generator instead of sharing the global one
+    rng = getattr(_thread_state, "rng", None)
+    if rng is None:
+        rng = _thread_state.rng = spawn_rng()
+    return rng
+
 
 class Customer:
-    id_counter = 0  # Static variable to track the last assigned ID
-
-    def __init__(self, customer_id):
-        Customer.id_counter += 1
-        self.id = Customer.id_counter
-        self.priority_queue = False if random.random() < 0.7 else True  # 70% chance to be a normal customer
-        self.spending_money = random.randint(5, 20)  # Random spending money for the shop
-
-
-class Attraction(AbstractHandler):
-    def __init__(self, capacity: int, duration: int):
-        self.capacity = capacity
-        self.current_capacity = 0
-        self.lock = threading.Lock()
-        self.duration = duration
-        self.normal_price = 10
-        self.entry_time = 0
-        self.exit_time = 0
-        self.priority_price = 25
-        self.visits_count = 0  # Count of visits to this attraction
-        self.priority_queue = queue.Queue()
-        self.normal_queue = queue.Queue()
-
-    def process_customer(self, customer: Customer):
+    __slots__ = ('id', 'priority_queue', 'spending_money')
+    _id_gen = itertools.count(1)  # Hands out customer IDs, next() on it is atomic
+
+    def __init__(self, rng: Optional[random.Random] = None):
+        self.reset(rng or thread_rng())
+
+    def reset(self, rng: random.Random):
+        self.id = next(Customer._id_gen)
+        self.priority_queue = rng.random() < 0.3  # 30% chance to be a priority customer
+        self.spending_money = rng.randint(5, 20)  # Random spending money for the shop
+
+    @classmethod
+    def acquire(cls, rng: Optional[random.Random] = None) -> Customer:
+        # Reuse a released customer when there is one instead of building a new object
+        try:
+            customer = _CUSTOMER_POOL.pop()  # Pop and catch, a separate emptiness check could race
+        except IndexError:
+            return cls(rng)
+        customer.reset(rng or thread_rng())
+        return customer
+
+    def release(self):
+        _CUSTOMER_POOL.append(self)
+
+
+_CUSTOMER_POOL: List[Customer] = []  # Released customers waiting to be reused
+
+
+class WorkerStats:
+    # Counters owned by a single worker thread, so they can be updated without a lock
+    __slots__ = ('visits', 'normal', 'priority', 'sales', 'entry_times', 'exit_times')
+
+    def __init__(self):
+        self.visits = 0
+        self.normal = 0
+        self.priority = 0
+        self.sales = 0
+        self.entry_times = array('d')  # Entry time of every visit served by this worker
+        self.exit_times = array('d')  # Exit time of the same visits
+
+
+class Attraction:
+    # Fixed per attraction type, so subclasses set them as class attributes
+    capacity: int
+    duration: int
+    name: str
+    normal_price = 10
+    priority_price = 25
+    __slots__ = ('_places', '_places_lock', '_local', '_priority_q', '_normal_q', '_wake', '_closed',
+                 '_stats', 'workers')
+
+    def __init__(self):
+        # Simulation mode: heap with the logical time at which each place becomes free, all free at opening
+        self._places = [time.time()] * self.capacity
+        self._places_lock = threading.Lock()
+        self._local = threading.local()  # Holds the WorkerStats of the current worker
+        self._priority_q = deque()  # Priority customers waiting for a worker
+        self._normal_q = deque()  # Normal customers waiting for a worker
+        self._wake = threading.Event()  # Set whenever a customer is queued or the attraction closes
+        self._closed = False
+        self._stats = [WorkerStats() for _ in range(self._worker_count())]
+        self.workers = [threading.Thread(target=self._run, args=(stats,), daemon=True) for stats in self._stats]
+        for worker in self.workers:
+            worker.start()
+
+    @property
+    def visits_count(self) -> int:
+        return sum(stats.visits for stats in self._stats)
+
+    @property
+    def normal_count(self) -> int:
+        return sum(stats.normal for stats in self._stats)
+
+    @property
+    def priority_count(self) -> int:
+        return sum(stats.priority for stats in self._stats)
+
+    @property
+    def total_sales(self) -> int:
+        return sum(stats.sales for stats in self._stats)
+
+    @property
+    def visit_durations(self) -> List[float]:
+        return [exit_time - entry_time
+                for stats in self._stats
+                for entry_time, exit_time in zip(stats.entry_times, stats.exit_times)]
+
+    def _worker_stats(self) -> WorkerStats:
+        return self._local.stats
+
+    def _worker_count(self) -> int:
+        # One worker per place, so the workers themselves are the capacity limit: a customer is only
+        # taken off the queue by a free worker, and never more than capacity visits run at once
+        return self.capacity
+
+    def _run(self, stats: WorkerStats):
+        self._local.stats = stats
+        while True:
+            customer = self._next_customer()
+            if customer is None:  # Closed and nobody left to serve
+                return
+            try:
+                log = self.process_customer(customer)
+            except Exception:
+                # Report the failure and keep serving, a dead worker would strand its queue
+                visit_log.exception("%s failed to serve customer %s", self.__class__.__name__, customer.id)
+                continue
+            if __debug__:
+                visit_log.info("\n".join(log))  # One record per visit instead of one per line
+
+    def _next_customer(self) -> Optional[Customer]:
+        while True:
+            # One customer at a time, so a priority customer queued meanwhile is always served next
+            for waiting in (self._priority_q, self._normal_q):
+                try:
+                    return waiting.popleft()
+                except IndexError:
+                    pass
+
+            # Both queues empty: check again after clearing so a customer queued meanwhile is not missed
+            self._wake.clear()
+            if self._priority_q or self._normal_q:
+                continue
+            if self._closed:
+                self._wake.set()  # Pass the wake-up on to the other workers
+                return None
+            self._wake.wait()
+
+    def close(self):
+        # Let the workers finish the queued customers, then stop them
+        self._closed = True
+        self._wake.set()
+        for worker in self.workers:
+            worker.join()
+
+    def process_customer(self, customer: Customer) -> List[str]:
+        # Returns the log lines of the visit so the worker can print them together
+        log = []
         customer_type = "Priority" if customer.priority_queue else "Normal"
         ticket_price = self.priority_price if customer.priority_queue else self.normal_price
-        with self.lock:
-            if self.current_capacity < self.capacity:
-                self.current_capacity += 1
-                self.visits_count += 1
-            else:
-                print(f"{self.__class__.__name__} is full. Please wait until the session is over...")
-                return "Capacity full"
-
-        self.entry_time = time.time()
-        entry_time_str = datetime.fromtimestamp(self.entry_time).strftime('%Y-%m-%d %H:%M:%S')
-        print(f"{customer_type} customer {customer.id} entered the {self.__class__.__name__} at {entry_time_str}")
-
-        time.sleep(self.duration)  # Simulate the customer's visit
-
-        self.exit_time = time.time()
-        exit_time_str = datetime.fromtimestamp(self.exit_time).strftime('%Y-%m-%d %H:%M:%S')
-        print(f"{customer_type} customer {customer.id} left the {self.__class__.__name__} at {exit_time_str}")
-
-        visit_duration = self.exit_time - self.entry_time
-        print(f"Customer {customer.id} spent {visit_duration:.2f} seconds at the {self.__class__.__name__}")
-
-    def handle(self, customer: Customer) -> str:
-        queue_used = self.priority_queue if customer.priority_queue else self.normal_queue
-        queue_used.put(customer)
-
-        # Check if there are priority customers waiting
-        if not self.priority_queue.empty():
-            while not self.priority_queue.empty():
-                priority_customer = self.priority_queue.get()
-                self.process_customer(priority_customer)
+        if SIMULATION_MODE:
+            # Simulate the visit on the place that frees up first, whichever thread serves it
+            with self._places_lock:
+                entry_time = self._places[0]
+                exit_time = entry_time + self.duration
+                heapq.heapreplace(self._places, exit_time)
         else:
-            # If no priority customers waiting, process normal customers
-            while not self.normal_queue.empty():
-                normal_customer = self.normal_queue.get()
-                self.process_customer(normal_customer)
-
-        return super().handle(customer)
+            entry_time = time.time()
+            time.sleep(self.duration)  # Simulate the customer's visit
+            exit_time = time.time()
+        # Only a visit that went through is counted and charged
+        stats = self._worker_stats()
+        stats.visits += 1
+        if customer.priority_queue:
+            stats.priority += 1
+        else:
+            stats.normal += 1
+        stats.entry_times.append(entry_time)
+        stats.exit_times.append(exit_time)
+        if __debug__:
+            log.append(f"{customer_type} customer {customer.id} entered the {self.__class__.__name__} at {format_time(entry_time)}")
+            log.append(f"{customer_type} customer {customer.id} left the {self.__class__.__name__} at {format_time(exit_time)}")
+            visit_duration = exit_time - entry_time
+            log.append(f"Customer {customer.id} spent {visit_duration:.2f} seconds at the {self.__class__.__name__}")
+        return log
+
+    def handle_many(self, customers: List[Customer]):
+        # Queue a whole group at once so the workers are woken a single time
+        self._priority_q.extend(customer for customer in customers if customer.priority_queue)
+        self._normal_q.extend(customer for customer in customers if not customer.priority_queue)
+        self._wake.set()
 
 class WaterPark(Attraction):
-    def __init__(self):
-        super().__init__(capacity=10, duration=6)
-        self.name = "WaterPark"
+    __slots__ = ()
+    capacity = 10
+    duration = 6
+    name = "WaterPark"
 
 class RollerCoaster(Attraction):
-    def __init__(self):
-        super().__init__(capacity=3, duration=3)
-        self.name = "RollerCoaster"
+    __slots__ = ()
+    capacity = 3
+    duration = 3
+    name = "RollerCoaster"
 
 class Shop(Attraction):
-    def __init__(self):
-        super().__init__(capacity=8, duration=7)
-        self.total_sales = 0  # To track additional spending in the shop
-        self.name = "Shop"
+    __slots__ = ()
+    capacity = 8
+    duration = 7
+    name = "Shop"
 
-    def process_customer(self, customer: Customer):
-        super().process_customer(customer)
+    def process_customer(self, customer: Customer) -> List[str]:
+        log = super().process_customer(customer)
         additional_spending = customer.spending_money
-        with self.lock:
-            self.total_sales += additional_spending
-        print(f"Customer {customer.id} spent an additional ${additional_spending:.2f} in the shop.")
+        self._worker_stats().sales += additional_spending
+        if __debug__:
+            log.append(f"Customer {customer.id} spent an additional ${additional_spending:.2f} in the shop.")
+        return log
 
 class FoodTruck(Attraction):
-    def __init__(self):
-        super().__init__(capacity=5, duration=2)
-        self.food_price = 5  # Flat rate for simplicity
-        self.name = "FoodTruck"
-
-    def process_customer(self, customer: Customer):
-        super().process_customer(customer)
-        with self.lock:
-            self.total_normal_profit += self.food_price
-            self.total_normal_clients += 1
-        print(f"Customer {customer.id} bought food for ${self.food_price:.2f}.")
+    __slots__ = ()
+    capacity = 5
+    duration = 2
+    food_price = 5  # Flat rate for simplicity
+    name = "FoodTruck"
+
+    def process_customer(self, customer: Customer) -> List[str]:
+        log = super().process_customer(customer)
+        self._worker_stats().sales += self.food_price
+        if __debug__:
+            log.append(f"Customer {customer.id} bought food for ${self.food_price:.2f}.")
+        return log
 
 class FerrisWheel(Attraction):
-    def __init__(self):
-        super().__init__(capacity=6, duration= 8)
-        self.name = "FerrisWheel"
+    __slots__ = ()
+    capacity = 6
+    duration = 8
+    name = "FerrisWheel"
 
 class ArcadeGames(Attraction):
-    def __init__(self):
-        super().__init__(capacity=4, duration=5)
-        self.name = "ArcadeGames"
+    __slots__ = ()
+    capacity = 4
+    duration = 5
+    name = "ArcadeGames"
 
 class CircusShow(Attraction):
-    def __init__(self):
-        super().__init__(capacity=15, duration=10)
-        self.name = "CircusShow"
+    __slots__ = ()
+    capacity = 15
+    duration = 10
+    name = "CircusShow"
 
 # New code
-class CustomerDatabase:
-    def __init__(self):
-        self.fake = Faker()
-
-    def generate_customers(self, num_customers: int) -> list[Customer]:
-        customers = []
-        for _ in range(num_customers):
-            customer_id = self.fake.uuid4().split('-')[0]  # Using first part of UUID as ID
-            customers.append(Customer(customer_id))
-        return customers
-
-def simulate_park_visit(attractions: List[Attraction], customer: Customer):
-    # Determine how many attractions the customer will visit
-    num_attractions_to_visit = random.randint(1, len(attractions))
-
-    # Randomly select attractions for the customer to visit
-    attractions_to_visit = random.sample(attractions, num_attractions_to_visit)
-
-    # Add customer to the appropriate queue
-    for attraction in attractions_to_visit:
-        if customer.priority_queue:  # This condition should check if the customer is a priority customer
-            attraction.priority_queue.put(customer)
-        else:
-            attraction.normal_queue.put(customer)
-
-    # Visit each selected attraction
-    for attraction in attractions_to_visit:
-        attraction.handle(customer)
+def plan_visits(num_customers: int, num_attractions: int, rng: random.Random) -> List[int]:
+    # One bit per attraction for every customer, an empty plan is redrawn so everybody visits something
+    if num_attractions < 1:
+        raise ValueError("Cannot plan visits without any attractions.")
+    plans = []
+    for _ in range(num_customers):
+        plan = rng.getrandbits(num_attractions)
+        while not plan:
+            plan = rng.getrandbits(num_attractions)
+        plans.append(plan)
+    return plans
+
+
+def simulate_park_visit(attractions: List[Attraction], customers: List[Customer], plans: List[int]):
+    # Group the customers by the attractions selected in their plans
+    visitors = [[] for _ in attractions]
+    for customer, plan in zip(customers, plans):
+        for index in range(len(attractions)):
+            if plan >> index & 1:
+                visitors[index].append(customer)
+
+    # Queue each attraction's visitors in one go
+    for attraction, group in zip(attractions, visitors):
+        attraction.handle_many(group)
 
 if __name__ == "__main__":
     num_customers = 20
+    start_logging()
 
     # Create attractions and customers
     attractions = [WaterPark(), RollerCoaster(), Shop(), FerrisWheel(), ArcadeGames(), CircusShow(), FoodTruck()]
-    customer_db = CustomerDatabase()
-    customers = customer_db.generate_customers(num_customers)
+    customers = [Customer.acquire() for _ in range(num_customers)]
 
     # Simulate park visits
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        for customer in customers:
-            executor.submit(simulate_park_visit, attractions, customer)
+    plans = plan_visits(num_customers, len(attractions), thread_rng())
+    simulate_park_visit(attractions, customers, plans)
+
+    # Wait for all attractions to serve their queues
+    for attraction in attractions:
+        attraction.close()
+    stop_logging()  # Writes out the remaining visit logs before the summary
 
-    # Wait for all threads to complete
-    executor.shutdown()
+    # Every customer has left the park, so their objects can be reused
+    for customer in customers:
+        customer.release()
 
     # Calculate and print summary statistics
-    total_normal_clients = sum(len(attraction.normal_queue.queue) for attraction in attractions)
-    total_priority_clients = sum(len(attraction.priority_queue.queue) for attraction in attractions)
+    total_normal_clients = 0
+    total_priority_clients = 0
+    shop_sales = 0
+    food_sales = 0
+    most_visited = None
+    visit_durations = []
+    for attraction in attractions:
+        visit_durations.extend(attraction.visit_durations)
+        total_normal_clients += attraction.normal_count
+        total_priority_clients += attraction.priority_count
+        if isinstance(attraction, Shop):
+            shop_sales += attraction.total_sales
+        elif isinstance(attraction, FoodTruck):
+            food_sales += attraction.total_sales
+        if most_visited is None or attraction.visits_count > most_visited.visits_count:
+            most_visited = attraction
     total_normal_profit = total_normal_clients * 10
     total_priority_profit = total_priority_clients * 25
-    shop_sales = next((attr.total_sales for attr in attractions if isinstance(attr, Shop)), 0)
-    total_park_profit = total_normal_profit + total_priority_profit + shop_sales
+    total_park_profit = total_normal_profit + total_priority_profit + shop_sales + food_sales
 
 
     print("\nSummary:::")
@@ -210,9 +382,12 @@ if __name__ == "__main__":
     print(f"Total normal profit: ${total_normal_profit:.2f}")
     print(f"Total priority profit: ${total_priority_profit:.2f}")
     print(f"Total shop sales: ${shop_sales:.2f}")
+    print(f"Total food sales: ${food_sales:.2f}")
+    if len(visit_durations) > 1:
+        print(f"Average visit duration: {statistics.fmean(visit_durations):.2f} seconds")
+        print(f"99th percentile visit duration: {statistics.quantiles(visit_durations, n=100, method='inclusive')[98]:.2f} seconds")
 
     # Determine the most visited attraction
     print("\nCalculating most visited attraction")
-    most_visited = max(attractions, key=lambda x: x.visits_count, default=None)
     if most_visited:
         print(f"{most_visited.__class__.__name__} is the most visited attraction with {most_visited.visits_count} visits.")
\ No newline at end of file